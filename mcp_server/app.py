@@ -1,47 +1,178 @@
-import torch  # Import torch to check for GPU
-import mcp.types as types
-from fastmcp import FastMCP
-from sentence_transformers import SentenceTransformer
+import os  # For environment configuration
+import sys
+import threading  # Guards the lazy model load
+
+# --- CPU Thread Configuration ---
+# Many container runtimes leave PyTorch with a single intra-op thread.
+# Use every core by default (override with MCP_TORCH_THREADS). The OpenMP/MKL
+# variables are read when torch is imported, so set them before importing it.
+num_threads = int(os.getenv("MCP_TORCH_THREADS", os.cpu_count() or 1))
+os.environ.setdefault("OMP_NUM_THREADS", str(num_threads))
+os.environ.setdefault("MKL_NUM_THREADS", str(num_threads))
+
+import torch  # noqa: E402  # Import torch to check for GPU
+import mcp.types as types  # noqa: E402
+from fastmcp import FastMCP  # noqa: E402
+
+from mcp_server.config import (  # noqa: E402
+    ONNX_EXPORT_DIR,
+    ONNX_FILE_NAME,
+    ONNX_INT8_FILE_NAME,
+)
+
+torch.set_num_threads(num_threads)
+try:
+    # A single inter-op thread avoids oversubscribing the intra-op pool
+    torch.set_num_interop_threads(1)
+except RuntimeError:
+    # Raised if torch already ran parallel work before this module loaded
+    pass
 
 # --- Determine Device ---
-# Check for MPS (Apple Silicon GPU), then CUDA, then fallback to CPU
-if torch.backends.mps.is_available():
-    device = "mps"
-elif torch.cuda.is_available():
+# Check for CUDA, then MPS (Apple Silicon GPU), then fallback to CPU
+if torch.cuda.is_available():
     device = "cuda"
+elif torch.backends.mps.is_available():
+    device = "mps"
 else:
     device = "cpu"
 
 # --- Embedding Model ---
-# Load the model once when the app starts.
+# The model is loaded lazily, on the first call to get_embedding_model().
+# When the document cache is valid no embeddings need to be generated, so
+# the server starts without loading the model (which takes seconds); it
+# is then loaded by the first search.
 # Choose a model suitable for your needs.
 # 'all-MiniLM-L6-v2' is a good starting point: fast and decent quality.
 # Other options: 'multi-qa-mpnet-base-dot-v1' (good for QA),
 # 'all-mpnet-base-v2' (higher quality, slower)
-# Use try-except to handle potential model loading issues gracefully
-try:
-    # Switch to a model trained for QA/Retrieval tasks
-    model_name = "multi-qa-mpnet-base-dot-v1"
+# Switch to a model trained for QA/Retrieval tasks
+model_name = "multi-qa-mpnet-base-dot-v1"
+# Backend used to run the model: "onnx" (onnxruntime) or "torch" (plain
+# SentenceTransformer). Both return identical fp32 embeddings. The ONNX
+# encoder runs on CPU, so default to torch whenever a GPU is available.
+embedding_backend = os.getenv(
+    "MCP_EMBEDDING_BACKEND", "onnx" if device == "cpu" else "torch"
+).lower()
+if embedding_backend == "onnx":
+    device = "cpu"
+# Set MCP_QUANTIZE=int8 to run the Linear/MatMul layers with dynamic int8
+# quantization. LayerNorm, Softmax and GELU stay in fp32 and the resulting
+# embeddings are still fp32.
+quantize_int8 = os.getenv("MCP_QUANTIZE", "").lower() == "int8"
+# Identifies the embeddings the configuration above produces. It is stored
+# with the document cache, and cached embeddings from a different model,
+# backend or quantization are not reused.
+embedding_config = {
+    "model": model_name,
+    "backend": embedding_backend,
+    # int8 is ignored by the torch backend on GPUs (see below)
+    "int8": quantize_int8 and (embedding_backend == "onnx" or device == "cpu"),
+}
+
+_embedding_model = None
+# Why loading the model failed, if it did. The load is not retried.
+_embedding_model_error = None
+_embedding_model_lock = threading.Lock()
+
+
+def _load_embedding_model():
+    """Loads the embedding model for the configured backend and device."""
+    if embedding_backend == "onnx":
+        from mcp_server.onnx_encoder import OnnxEncoder
+
+        # Exported once to ONNX, then served by onnxruntime on CPU.
+        # This model uses CLS pooling (see its 1_Pooling/config.json).
+        return OnnxEncoder(
+            model_name,
+            ONNX_EXPORT_DIR / model_name,
+            pooling="cls",
+            quantize=quantize_int8,
+            num_threads=num_threads,
+        )
+
+    from sentence_transformers import SentenceTransformer
+
     # Pass the determined device to the model
-    embedding_model = SentenceTransformer(model_name, device=device)
-    # Log the device being used
-    import sys
-
-    print(
-        f"Embedding model '{model_name}' loaded on device: {device}",
-        file=sys.stderr,
-    )
-except Exception as e:
-    # Log errors to stderr instead of stdout if needed for debugging
-    import sys
-
-    print(
-        f"FATAL: Failed to load embedding model on device '{device}': {e}",
-        file=sys.stderr,
-    )
-    # Decide how to handle this - exit? Or proceed without semantic search?
-    # For now, let's raise it to stop the server from starting incorrectly.
-    raise RuntimeError("Failed to load embedding model") from e
+    model = SentenceTransformer(model_name, device=device)
+    if quantize_int8 and device == "cpu":
+        # Dynamic quantization kernels (FBGEMM/QNNPACK) are CPU-only
+        model[0].auto_model = torch.quantization.quantize_dynamic(
+            model[0].auto_model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    elif quantize_int8:
+        print(
+            f"Warning: MCP_QUANTIZE=int8 is only supported on CPU, "
+            f"ignoring it on device '{device}'.",
+            file=sys.stderr,
+        )
+    return model
+
+
+def get_embedding_model():
+    """
+    Returns the shared embedding model, loading it on first use.
+
+    Raises RuntimeError if the model cannot be loaded. A failed load is
+    logged once and remembered: later calls raise right away instead of
+    retrying the slow load on every search.
+    """
+    global _embedding_model, _embedding_model_error
+    if _embedding_model is None:
+        with _embedding_model_lock:
+            if _embedding_model is None:
+                if _embedding_model_error is not None:
+                    raise RuntimeError(
+                        f"Failed to load embedding model: {_embedding_model_error}"
+                    ) from _embedding_model_error
+                # Use try-except to handle potential model loading issues
+                try:
+                    _embedding_model = _load_embedding_model()
+                except Exception as e:
+                    _embedding_model_error = e
+                    # Log errors to stderr instead of stdout
+                    print(
+                        f"Error: Failed to load embedding model on device "
+                        f"'{device}': {e}",
+                        file=sys.stderr,
+                    )
+                    raise RuntimeError(f"Failed to load embedding model: {e}") from e
+                # Log the device being used
+                print(
+                    f"Embedding model '{model_name}' loaded on device: {device} "
+                    f"(backend: {embedding_backend}, int8: {quantize_int8})",
+                    file=sys.stderr,
+                )
+    return _embedding_model
+
+
+def prepare_embedding_model() -> None:
+    """
+    Loads the model now if the ONNX backend still has to export it.
+
+    The one-time export (and int8 quantization) takes much longer than a
+    load, so it runs at startup instead of inside the first search. Once
+    the files exist the model stays lazily loaded. Failures are logged and
+    remembered by get_embedding_model(), not raised.
+    """
+    if embedding_backend != "onnx":
+        return
+    graph_name = ONNX_INT8_FILE_NAME if quantize_int8 else ONNX_FILE_NAME
+    if (ONNX_EXPORT_DIR / model_name / graph_name).exists():
+        return
+    try:
+        get_embedding_model()
+    except RuntimeError:
+        pass
+
+
+def __getattr__(name: str):
+    # Backward compatibility: `from mcp_server.app import embedding_model`
+    # still works, but loads the model at import time. Prefer
+    # get_embedding_model() so the model is only loaded when needed.
+    if name == "embedding_model":
+        return get_embedding_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # --- MCP Server Instance ---
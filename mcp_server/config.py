@@ -1,9 +1,20 @@
-import pickle
 from pathlib import Path
 
 # Directory where the crawled markdown files are stored
 STORAGE_DIR = Path("./storage")
 
-# Path for caching the processed chunks and embeddings
-# Store it alongside the storage dir for simplicity
-CACHE_FILE_PATH = STORAGE_DIR / "document_chunks_cache.pkl"
+# Paths for caching the processed chunks and embeddings
+# Store them alongside the storage dir for simplicity
+# Chunk metadata (filenames, headings, content) as gzipped JSON
+CACHE_META_PATH = STORAGE_DIR / "document_chunks_cache.json.gz"
+# fp16 embedding matrix as .npy, memory-mapped on load
+CACHE_EMBEDDINGS_PATH = STORAGE_DIR / "document_embeddings_cache.npy"
+# L2 norm of each embedding (the matrix above holds unit vectors)
+CACHE_NORMS_PATH = STORAGE_DIR / "document_embedding_norms_cache.npy"
+
+# Directory where the ONNX export of the embedding model is kept
+ONNX_EXPORT_DIR = STORAGE_DIR / "onnx"
+# Name of the exported graph inside the export directory
+ONNX_FILE_NAME = "model.onnx"
+# Name of the dynamically int8-quantized copy of the graph
+ONNX_INT8_FILE_NAME = "model.int8.onnx"
@@ -1,268 +1,550 @@
-import re
-import pickle  # For caching
+import gzip  # For the compressed chunk metadata cache
+import json  # For the chunk metadata cache
 import os  # For stat
 import sys  # Ensure sys is imported for stderr usage throughout
+from concurrent.futures import ProcessPoolExecutor  # For parallel parsing
+from pathlib import Path
 
-from typing import List, Dict, Union, Any  # Added Any
+from typing import List, Dict, Union, Any, Optional  # Added Any
 
 import numpy as np  # For np.ndarray type hint
 
 # Import config variables and the embedding model
-from mcp_server.config import STORAGE_DIR, CACHE_FILE_PATH
-from mcp_server.app import embedding_model
+from mcp_server.config import (
+    STORAGE_DIR,
+    CACHE_META_PATH,
+    CACHE_EMBEDDINGS_PATH,
+    CACHE_NORMS_PATH,
+)
+from mcp_server.app import get_embedding_model, device, embedding_config
+
+# Parsing helpers; parse_markdown_to_chunks is re-exported for callers
+# that imported it from here
+from mcp_server.markdown_parser import (  # noqa: F401
+    content_hash,
+    parse_markdown_file,
+    parse_markdown_to_chunks,
+)
+
+# In-memory storage for chunk metadata (filename, heading, content, ...)
+document_chunks: List[Dict[str, str]] = []
+# Embeddings for all chunks as one contiguous (num_chunks, dim) fp32 matrix
+# of L2-normalized rows (stored as fp16 in the cache). Row i belongs to
+# document_chunks[i]. None if embedding generation failed.
+document_embeddings: Optional[np.ndarray] = None
+# fp32 L2 norm of each original embedding. The model is trained for dot
+# product scores, so search multiplies the unit-vector scores back by these.
+# A norm of 0 marks a chunk without an embedding, which search skips.
+document_embedding_norms: Optional[np.ndarray] = None
+
+
+# Parsing takes milliseconds per MB, while starting worker processes
+# (spawn, the macOS default, starts a fresh interpreter for each) takes
+# hundreds of milliseconds, so smaller inputs are parsed in this process
+_PARALLEL_PARSE_MIN_BYTES = 16 * 1024 * 1024
+
+# Chunk fields that are restored on load and therefore not cached: the
+# filename is the key of the file's cache entry
+_UNCACHED_CHUNK_KEYS = ("filename",)
+
+
+def _embeddings_match(embeddings: Any, norms: Any, num_chunks: int) -> bool:
+    """Checks that a cached embedding matrix and norms fit the chunk list."""
+    return (
+        isinstance(embeddings, np.ndarray)
+        and embeddings.dtype == np.float16
+        and embeddings.ndim == 2
+        and embeddings.shape[0] == num_chunks
+        and isinstance(norms, np.ndarray)
+        and norms.dtype == np.float32
+        and norms.shape == (num_chunks,)
+    )
+
+
+def _normalize_embeddings(embeddings: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Splits fp32 embeddings into contiguous fp16 unit vectors and fp32 norms,
+    as stored in the cache.
+
+    Unit vectors lose less precision in fp16 than raw dot-v1 embeddings, and
+    fp16 halves the size of the cache file.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1)
+    # Leave all-zero rows as zeros instead of dividing by zero
+    safe_norms = np.where(norms > 0, norms, 1.0)
+    normalized = np.ascontiguousarray(
+        embeddings / safe_norms[:, None], dtype=np.float16
+    )
+    return normalized, norms.astype(np.float32)
+
 
-# Simple regex to find markdown headings (##, ###, etc.)
-HEADING_RE = re.compile(r"^(#{2,4})\s+(.*)")
-# Simple regex to find Source: URL lines
-SOURCE_RE = re.compile(r"Source:\s*(https?://\S+)")
+def _search_matrix(embeddings: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    """
+    Returns the fp32 copy of an fp16 embedding matrix that search uses.
 
-# In-memory storage for chunks - now includes embeddings
-# In-memory storage for chunks, including embeddings
-document_chunks: List[Dict[str, Union[str, np.ndarray]]] = []
+    numpy has no fp16 matrix product: searching the fp16 matrix directly
+    would cast all of it to a temporary fp32 copy on every query.
+    """
+    if embeddings is None:
+        return None
+    return np.array(embeddings, dtype=np.float32)
 
 
-def parse_markdown_to_chunks(filename: str, content: str) -> List[Dict[str, str]]:
+def _file_unchanged(name: str, cached: Any, current: Dict[str, Any]) -> bool:
     """
-    Parses markdown content into chunks based on headings (## and deeper).
+    Compares a file's cache entry with its current metadata, filling in the
+    current entry's content hash when the file is unchanged.
 
-    Each chunk includes the heading, the content following it, and any
-    detected Source: URL immediately after the heading.
+    Files whose size and mtime match the cache reuse the cached hash. A file
+    with a new mtime (e.g. after git checkout or rsync) but the same size is
+    hashed, and counts as unchanged if its content hash still matches.
     """
-    chunks = []
-    lines = content.splitlines()
-    # Default for content before the first heading
-    current_heading = "Introduction"
-    current_content: List[str] = []
-    # Use Union explicitly if Optional was removed from imports
-    current_source_url: Union[str, None] = None
-    heading_level = 1  # Default heading level
-
-    for i, line in enumerate(lines):
-        heading_match = HEADING_RE.match(line)
-        source_match = SOURCE_RE.match(line)
-
-        if heading_match:
-            # If we have content for the previous heading, save it as a chunk
-            if current_content:
-                content_str = "\n".join(current_content).strip()
-                if content_str:  # Only add if there's actual content
-                    chunks.append(
-                        {
-                            "filename": filename,
-                            "heading": current_heading,
-                            "content": content_str,
-                            "content_lower": content_str.lower(),
-                            "heading_lower": current_heading.lower(),
-                            "source_url": current_source_url or "",
-                            "level": str(heading_level),
-                        }
-                    )
+    if not isinstance(cached, dict) or cached.get("size") != current["size"]:
+        return False
+    if cached.get("mtime") != current["mtime"]:
+        if cached.get("hash") is None:
+            return False
+        try:
+            digest = content_hash((STORAGE_DIR / name).read_bytes())
+        except OSError:
+            return False
+        if digest != cached["hash"]:
+            return False
+    current["hash"] = cached.get("hash")
+    return True
 
-            # Start a new chunk
-            # '#' count indicates level
-            heading_level = len(heading_match.group(1))
-            current_heading = heading_match.group(2).strip()
-            current_content = []
-            current_source_url = None  # Reset source URL for the new section
-
-            # Check the *next* line for a potential Source: URL
-            if i + 1 < len(lines):
-                next_line_source_match = SOURCE_RE.match(lines[i + 1])
-                if next_line_source_match:
-                    current_source_url = next_line_source_match.group(1)
-
-        elif source_match and current_heading == "Introduction":
-            # Capture Source: URL if it appears before the first heading
-            current_source_url = source_match.group(1)
-        # Avoid adding the Source: line itself to content
-        elif not source_match:
-            current_content.append(line)
-
-    # Add the last chunk
-    if current_content:
-        content_str = "\n".join(current_content).strip()
-        if content_str:
-            chunks.append(
+
+def _load_cache() -> tuple[Dict[str, Dict[str, Any]], np.ndarray, np.ndarray]:
+    """
+    Reads the per-file cache, the embedding matrix and the embedding norms.
+
+    Returns ({filename: {size, mtime, hash, chunks, start}}, embeddings,
+    norms). Chunk metadata comes from gzipped JSON; the embedding matrix is
+    memory-mapped from .npy, so it is read once when the caller converts
+    reused rows to fp32, without an intermediate copy. Each file's
+    embeddings are the rows [start, start + len(chunks)).
+
+    Raises ValueError if the cache was built with a different embedding
+    configuration, so no file's embeddings are mixed with new ones.
+    """
+    with gzip.open(CACHE_META_PATH, "rt", encoding="utf-8") as f_meta:
+        cache_meta = json.load(f_meta)
+    if cache_meta.get("encoder") != embedding_config:
+        raise ValueError("cache was built with a different embedding model")
+    cached_files = cache_meta["files"]
+    # allow_pickle=False: the matrix is a raw buffer, never a pickle
+    embeddings = np.load(CACHE_EMBEDDINGS_PATH, mmap_mode="r", allow_pickle=False)
+    norms = np.load(CACHE_NORMS_PATH, allow_pickle=False)
+
+    start = 0
+    for name, entry in cached_files.items():
+        entry["start"] = start
+        start += len(entry["chunks"])
+        # json.load creates a new string object for every value. Interning
+        # the repeated ones keeps a single copy of each in memory.
+        filename = sys.intern(name)
+        for chunk in entry["chunks"]:
+            # Restore the fields left out of the cache (_UNCACHED_CHUNK_KEYS)
+            chunk["filename"] = filename
+            chunk["heading"] = sys.intern(chunk["heading"])
+            chunk["source_url"] = sys.intern(chunk["source_url"])
+            chunk["level"] = sys.intern(chunk["level"])
+    if not _embeddings_match(embeddings, norms, start):
+        raise ValueError("embedding matrix does not match the cached chunks")
+    return cached_files, embeddings, norms
+
+
+def _save_cache(
+    files: Dict[str, Dict[str, Any]],
+    embeddings: Optional[np.ndarray] = None,
+    norms: Optional[np.ndarray] = None,
+) -> None:
+    """
+    Writes the per-file cache. files maps each filename to its size, mtime,
+    hash and chunks, in the order of its rows in the embedding matrix. The
+    embedding configuration (app.embedding_config) is stored alongside.
+    Chunk fields in _UNCACHED_CHUNK_KEYS are dropped (each file's filename
+    is stored once, as its key) and the JSON is written without
+    whitespace, which keeps the file small and quick to parse on load.
+
+    The embedding matrix and norms go first and the metadata file last, so
+    a valid metadata file always describes complete arrays. All files are
+    replaced atomically. On POSIX systems existing memory maps of the
+    previous matrix stay valid; on Windows the matrix file cannot be
+    replaced while it is mapped, so callers release their maps first.
+    Without embeddings only the metadata file is rewritten, for when the
+    arrays on disk are already up to date.
+    """
+    CACHE_META_PATH.parent.mkdir(parents=True, exist_ok=True)
+    if embeddings is not None:
+        arrays = ((embeddings, CACHE_EMBEDDINGS_PATH), (norms, CACHE_NORMS_PATH))
+        for array, path in arrays:
+            tmp_path = path.with_suffix(".tmp.npy")
+            # Writes the header and then the array buffer as-is: no pickling
+            # and no intermediate bytes copy of the matrix
+            np.save(tmp_path, array, allow_pickle=False)
+            os.replace(tmp_path, path)
+
+    cache_files = {
+        name: {
+            "size": entry["size"],
+            "mtime": entry["mtime"],
+            "hash": entry["hash"],
+            "chunks": [
                 {
-                    "filename": filename,
-                    "heading": current_heading,
-                    "content": content_str,
-                    "content_lower": content_str.lower(),
-                    "heading_lower": current_heading.lower(),
-                    "source_url": current_source_url or "",
-                    "level": str(heading_level),
+                    key: value
+                    for key, value in chunk.items()
+                    if key not in _UNCACHED_CHUNK_KEYS
                 }
+                for chunk in entry["chunks"]
+            ],
+        }
+        for name, entry in files.items()
+    }
+    tmp_meta_path = CACHE_META_PATH.with_suffix(".tmp")
+    with gzip.open(tmp_meta_path, "wt", encoding="utf-8") as f_meta:
+        json.dump(
+            {"encoder": embedding_config, "files": cache_files},
+            f_meta,
+            separators=(",", ":"),
+        )
+    os.replace(tmp_meta_path, CACHE_META_PATH)
+
+
+def _delete_cache() -> None:
+    """Deletes the cache files, logging (not raising) on failure."""
+    for cache_path in (CACHE_META_PATH, CACHE_EMBEDDINGS_PATH, CACHE_NORMS_PATH):
+        try:
+            cache_path.unlink(missing_ok=True)
+        except OSError as unlink_e:
+            print(
+                f"Warning: Could not delete cache file {cache_path}: {unlink_e}",
+                file=sys.stderr,
             )
 
-    return chunks
+
+def _scan_markdown_files() -> List[os.DirEntry]:
+    """
+    Lists the .md files in STORAGE_DIR, like glob("*.md").
+
+    os.scandir gets names and file types from a single directory read, and
+    each DirEntry caches its stat() result, so every file is stat'ed once.
+    Raises OSError if the directory cannot be read.
+    """
+    with os.scandir(STORAGE_DIR) as it:
+        return [
+            entry for entry in it if entry.name.endswith(".md") and entry.is_file()
+        ]
+
+
+def _parse_files(
+    paths: List[Path], total_size: int
+) -> Dict[str, tuple[Optional[str], List[Dict[str, str]]]]:
+    """
+    Parses the given markdown files, in parallel worker processes when there
+    is more than one and their total_size (from the directory scan) is at
+    least _PARALLEL_PARSE_MIN_BYTES. Returns {filename: (content hash,
+    chunks)}; files that fail are logged and get (None, []).
+    """
+    results: Dict[str, tuple[Optional[str], List[Dict[str, str]]]] = {}
+
+    if len(paths) <= 1 or total_size < _PARALLEL_PARSE_MIN_BYTES:
+        # Not worth starting worker processes
+        for path in paths:
+            try:
+                results[path.name] = parse_markdown_file(path)
+            except Exception as e:
+                print(f"Error processing file {path.name}: {e}", file=sys.stderr)
+                results[path.name] = (None, [])
+        return results
+
+    max_workers = min(len(paths), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            path.name: executor.submit(parse_markdown_file, path) for path in paths
+        }
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                print(f"Error processing file {name}: {e}", file=sys.stderr)
+                results[name] = (None, [])
+    return results
 
 
 def load_and_chunk_documents():
     """
     Scans the STORAGE_DIR, reads .md files, parses them into chunks,
-    generates embeddings, and stores them in the global document_chunks list.
-    Uses a cache file to speed up subsequent loads.
+    generates embeddings, and stores them in the global document_chunks list
+    and the document_embeddings / document_embedding_norms arrays.
+    Uses a per-file cache, so only new or changed files are parsed and
+    embedded again.
     """
-    global document_chunks
+    global document_chunks, document_embeddings, document_embedding_norms
+
+    if not STORAGE_DIR.exists() or not STORAGE_DIR.is_dir():
+        print(
+            f"Error: Storage directory '{STORAGE_DIR}' not found or is "
+            "not a directory.",
+            file=sys.stderr,
+        )
+        document_chunks = []
+        document_embeddings = document_embedding_norms = None
+        return
 
     # --- Get current state of markdown files ---
+    try:
+        md_entries = _scan_markdown_files()
+    except OSError as e:
+        # Leave the cache alone: the files may be readable on the next start
+        print(
+            f"Error: Could not read storage directory '{STORAGE_DIR}': {e}",
+            file=sys.stderr,
+        )
+        document_chunks = []
+        document_embeddings = document_embedding_norms = None
+        return
     current_file_metadata = {}
-    if STORAGE_DIR.exists() and STORAGE_DIR.is_dir():
-        for file_path in STORAGE_DIR.glob("*.md"):
-            try:
-                # Get modification time
-                mtime = os.path.getmtime(file_path)
-                current_file_metadata[file_path.name] = mtime
-            except OSError as e:
-                print(
-                    f"Warning: Could not get metadata for {file_path.name}: {e}",
-                    file=sys.stderr,
-                )
-                # Decide how to handle - skip file? invalidate cache?
-                # For now, assume cache should be invalidated if we can't check
-                # all files.
-                current_file_metadata = None  # Signal error
-                break
-    else:
-        # Signal error / directory not found
-        current_file_metadata = None
-
-    # --- Try loading from cache and validate metadata ---
-    cache_valid = False
-    if current_file_metadata is not None and CACHE_FILE_PATH.exists():
+    for entry in md_entries:
         try:
-            with open(CACHE_FILE_PATH, "rb") as f_cache:
-                # Expecting a tuple: (metadata_dict, chunks_list)
-                cached_metadata, cached_chunks = pickle.load(f_cache)
-
-                # Validate cache structure and compare metadata
-                if isinstance(cached_metadata, dict) and isinstance(
-                    cached_chunks, list
-                ):
-                    if cached_metadata == current_file_metadata:
-                        document_chunks = cached_chunks
-                        cache_valid = True
-                    else:
-                        print(
-                            "Cache metadata mismatch. Source files changed. "
-                            "Regenerating cache.",
-                            file=sys.stderr,
-                        )
-                else:
-                    print(
-                        "Warning: Cache file format is invalid. " "Regenerating cache.",
-                        file=sys.stderr,
-                    )
+            # Get size and modification time; the content hash is filled
+            # in lazily, only for files whose mtime changed
+            stat_result = entry.stat()
+            current_file_metadata[entry.name] = {
+                "size": stat_result.st_size,
+                "mtime": stat_result.st_mtime,
+                "hash": None,
+            }
+        except OSError as e:
+            print(
+                f"Warning: Could not get metadata for {entry.name}: {e}",
+                file=sys.stderr,
+            )
+            # Decide how to handle - skip file? invalidate cache?
+            # For now, assume cache should be invalidated if we can't check
+            # all files.
+            current_file_metadata = None  # Signal error
+            break
+
+    # --- Try loading from cache ---
+    cached_files: Dict[str, Dict[str, Any]] = {}
+    cached_embeddings: Optional[np.ndarray] = None
+    cached_norms: Optional[np.ndarray] = None
+    if current_file_metadata is not None and CACHE_META_PATH.exists():
+        try:
+            cached_files, cached_embeddings, cached_norms = _load_cache()
         except Exception as e:
             print(
                 f"Warning: Failed to load or validate cache ({e}). "
                 "Regenerating cache.",
                 file=sys.stderr,
             )
-            # Don't try deletion inside the exception handler for loading
-
-        # --- Delete invalid/outdated cache file ---
-        if not cache_valid and CACHE_FILE_PATH.exists():
-            # Attempting to delete invalid/outdated cache file...
+            cached_files, cached_embeddings, cached_norms = {}, None, None
+            # --- Delete invalid cache files ---
+            _delete_cache()
+
+    # --- Work out which files need to be (re)processed ---
+    if current_file_metadata is None:
+        # Without metadata for every file nothing can be validated
+        file_names = [entry.name for entry in md_entries]
+        changed_files = file_names
+    else:
+        file_names = list(current_file_metadata)
+        changed_files = [
+            name
+            for name, current in current_file_metadata.items()
+            if not _file_unchanged(name, cached_files.get(name), current)
+        ]
+    # Cache entries of deleted files are dropped when the cache is rewritten
+    removed_files = cached_files.keys() - set(file_names)
+
+    if current_file_metadata is not None and not changed_files and not removed_files:
+        # --- Cache hit: every file is unchanged ---
+        document_chunks = [
+            chunk for entry in cached_files.values() for chunk in entry["chunks"]
+        ]
+        document_embeddings = _search_matrix(cached_embeddings)
+        document_embedding_norms = cached_norms
+        if any(
+            cached_files[name]["mtime"] != current["mtime"]
+            for name, current in current_file_metadata.items()
+        ):
+            # Only mtimes changed: record them so the files are not hashed
+            # again on the next start
             try:
-                CACHE_FILE_PATH.unlink(missing_ok=True)
-            except OSError as unlink_e:
+                _save_cache(
+                    {
+                        name: {**current_file_metadata[name], "chunks": entry["chunks"]}
+                        for name, entry in cached_files.items()
+                    }
+                )
+            except Exception as e:
                 print(
-                    f"Warning: Could not delete cache file: {unlink_e}",
+                    f"Warning: Failed to update cache metadata: {e}",
                     file=sys.stderr,
                 )
+        return
 
-    # --- If cache was invalid or didn't exist, process files ---
-    if not cache_valid:
+    # --- Parse new and changed files ---
+    if changed_files:  # Otherwise only files were removed
         print(
-            "Processing documents and generating embeddings...",
+            f"Processing {len(changed_files)} new or changed documents and "
+            "generating embeddings...",
             file=sys.stderr,
         )
-        if not STORAGE_DIR.exists() or not STORAGE_DIR.is_dir():
+    parsed_files: Dict[str, List[Dict[str, str]]] = {}
+    # Reuse the paths from the directory scan instead of listing it again
+    paths_by_name = {entry.name: Path(entry.path) for entry in md_entries}
+    changed_paths = [paths_by_name[name] for name in changed_files]
+    # Sizes come from the scan's stat() calls; without them (a stat failed)
+    # the files are parsed in this process
+    changed_size = (
+        sum(current_file_metadata[name]["size"] for name in changed_files)
+        if current_file_metadata is not None
+        else 0
+    )
+    parse_results = _parse_files(changed_paths, changed_size)
+    for name, (digest, file_chunks) in parse_results.items():
+        parsed_files[name] = file_chunks
+        if current_file_metadata is not None:
+            current_file_metadata[name]["hash"] = digest
+
+    # --- Generate Embeddings (new and changed files only) ---
+    new_chunks = [chunk for name in changed_files for chunk in parsed_files[name]]
+    new_embeddings = new_norms = None
+    if new_chunks:
+        # Prepare texts for embedding (e.g., combine heading and content)
+        # Using just content for now. Consider heading+content?
+        texts_to_embed = [chunk["content"] for chunk in new_chunks]
+        try:
+            # Encode all texts at once for efficiency
+            # Set show_progress_bar=True for CLI progress feedback
             print(
-                f"Error: Storage directory '{STORAGE_DIR}' not found or is "
-                "not a directory.",
+                f"Generating embeddings for {len(texts_to_embed)} chunks...",
                 file=sys.stderr,
             )
-            document_chunks = []
-            return
-
-        loaded_chunks = []
-        for file_path in STORAGE_DIR.glob("*.md"):
-            try:
-                content = file_path.read_text(encoding="utf-8")
-                file_chunks = parse_markdown_to_chunks(file_path.name, content)
-                loaded_chunks.extend(file_chunks)
-            except Exception as e:
-                # Rely on the global import of sys
-                print(
-                    f"Error processing file {file_path.name}: {e}",
-                    file=sys.stderr,
-                )
-
-        # --- Generate Embeddings ---
-        if loaded_chunks:
-            # Prepare texts for embedding (e.g., combine heading and content)
-            # Using just content for now. Consider heading+content?
-            texts_to_embed = [chunk["content"] for chunk in loaded_chunks]
-            try:
-                # Encode all texts at once for efficiency
-                # Set show_progress_bar=True for CLI progress feedback
-                print(
-                    f"Generating embeddings for {len(texts_to_embed)} chunks...",
-                    file=sys.stderr,
-                )
-                embeddings = embedding_model.encode(
-                    texts_to_embed,
-                    show_progress_bar=True,  # Enable progress bar
-                )
-                # Add embeddings back to the chunk dictionaries
-                for i, chunk in enumerate(loaded_chunks):
-                    chunk["embedding"] = embeddings[i]
-            except Exception as e:
-                print(f"Error generating embeddings: {e}", file=sys.stderr)
-                # Handle error: proceed without embeddings if encoding fails.
-                for chunk in loaded_chunks:
-                    # Indicate embedding failed/missing
-                    chunk["embedding"] = None
-
-        # Update the global list *after* potential embedding
-        document_chunks = loaded_chunks
-
-        # --- Save the processed data and metadata to cache ---
-        # Only save if processing was successful and we have metadata
-        if document_chunks and current_file_metadata is not None:
-            print(
-                f"Saving {len(document_chunks)} chunks and embeddings to "
-                f"cache: {CACHE_FILE_PATH}",
-                file=sys.stderr,
+            # Both backends sort inputs by length before batching, so
+            # padding stays small and a larger batch size pays off.
+            # CUDA devices have the memory for even larger batches.
+            # The model is only loaded here, when something needs embedding
+            embeddings = get_embedding_model().encode(
+                texts_to_embed,
+                batch_size=128 if device == "cuda" else 64,
+                show_progress_bar=True,  # Enable progress bar
+                convert_to_numpy=True,  # Host arrays, ready to cache
             )
-            try:
-                # Ensure parent directory exists
-                CACHE_FILE_PATH.parent.mkdir(parents=True, exist_ok=True)
-                # Data to cache: tuple of (metadata, chunks)
-                # Using Any for chunk dict value type (mixed str, np.ndarray)
-                data_to_cache: tuple[Dict[str, float], List[Dict[str, Any]]] = (
-                    current_file_metadata,
-                    document_chunks,
-                )
-                with open(CACHE_FILE_PATH, "wb") as f_cache:
-                    pickle.dump(data_to_cache, f_cache)
-            except Exception as e:
-                print(
-                    f"Warning: Failed to save cache to {CACHE_FILE_PATH}: {e}",
-                    file=sys.stderr,
+            # Cache as one contiguous fp16 matrix of unit vectors plus fp32
+            # norms, which halves the cache size. Similarity search is then
+            # a single matrix-vector product with no per-query
+            # normalization.
+            new_embeddings, new_norms = _normalize_embeddings(embeddings)
+        except Exception as e:
+            print(f"Error generating embeddings: {e}", file=sys.stderr)
+            # Handle error: proceed without embeddings if encoding fails.
+
+    # --- Merge cached and newly processed files, in directory order ---
+    # If encoding failed, cached rows of unchanged files stay searchable;
+    # chunks of the changed files get zero rows with norm 0 (no embedding)
+    embeddings_failed = bool(new_chunks) and new_embeddings is None
+    loaded_chunks: List[Dict[str, str]] = []
+    embedding_parts: List[np.ndarray] = []
+    norm_parts: List[np.ndarray] = []
+    files_to_cache: Dict[str, Dict[str, Any]] = {}
+    new_offset = 0
+    for name in file_names:
+        if name in parsed_files:
+            file_chunks = parsed_files[name]
+            if new_embeddings is not None:
+                rows = slice(new_offset, new_offset + len(file_chunks))
+                embedding_parts.append(new_embeddings[rows])
+                norm_parts.append(new_norms[rows])
+            elif cached_embeddings is not None:
+                embedding_parts.append(
+                    np.zeros(
+                        (len(file_chunks), cached_embeddings.shape[1]),
+                        dtype=np.float16,
+                    )
                 )
-        elif not document_chunks:
-            print(
-                "No document chunks loaded or generated, cache not saved.",
-                file=sys.stderr,
-            )
-        else:  # current_file_metadata was None
+                norm_parts.append(np.zeros(len(file_chunks), dtype=np.float32))
+            new_offset += len(file_chunks)
+        else:
+            entry = cached_files[name]
+            file_chunks = entry["chunks"]
+            rows = slice(entry["start"], entry["start"] + len(file_chunks))
+            embedding_parts.append(cached_embeddings[rows])
+            norm_parts.append(cached_norms[rows])
+        loaded_chunks.extend(file_chunks)
+        if current_file_metadata is not None:
+            files_to_cache[name] = {
+                **current_file_metadata[name],
+                "chunks": file_chunks,
+            }
+
+    # Update the globals *after* potential embedding
+    document_chunks = loaded_chunks
+    files_reused = len(changed_files) < len(file_names)
+    # fp16 matrix of every row, as written to the cache
+    stored_embeddings: Optional[np.ndarray] = None
+    if loaded_chunks and not embeddings_failed and not files_reused:
+        # Nothing reused: the new matrix already has every row, in order
+        stored_embeddings = new_embeddings
+        document_embedding_norms = new_norms
+    elif loaded_chunks and (not embeddings_failed or files_reused):
+        # Copies reused rows out of the memory map into one new matrix
+        stored_embeddings = np.concatenate(embedding_parts)
+        document_embedding_norms = np.concatenate(norm_parts)
+    else:
+        document_embedding_norms = None
+    document_embeddings = _search_matrix(stored_embeddings)
+    # Release the memory map of the previous matrix before it is replaced:
+    # Windows cannot replace a file that is still mapped
+    cached_embeddings = cached_norms = None
+    embedding_parts.clear()
+    norm_parts.clear()
+
+    # --- Save the processed data and metadata to cache ---
+    # Only save if processing was successful and we have metadata
+    if (
+        document_embeddings is not None
+        and not embeddings_failed
+        and current_file_metadata is not None
+    ):
+        print(
+            f"Saving {len(document_chunks)} chunks and embeddings to "
+            f"cache: {CACHE_META_PATH}",
+            file=sys.stderr,
+        )
+        try:
+            _save_cache(files_to_cache, stored_embeddings, document_embedding_norms)
+        except Exception as e:
             print(
-                "Could not read current file metadata, cache not saved.",
+                f"Warning: Failed to save cache to {CACHE_META_PATH}: {e}",
                 file=sys.stderr,
             )
+    elif not document_chunks:
+        print(
+            "No document chunks loaded or generated, cache not saved.",
+            file=sys.stderr,
+        )
+        # Drop a cache that only described files which no longer exist
+        _delete_cache()
+    elif current_file_metadata is None:
+        print(
+            "Could not read current file metadata, cache not saved.",
+            file=sys.stderr,
+        )
+    elif document_embeddings is not None:  # Failed for changed files only
+        print(
+            "Embeddings could not be generated for new or changed documents, "
+            "cache not saved. Only unchanged documents are searchable.",
+            file=sys.stderr,
+        )
+    else:  # Embedding generation failed
+        print(
+            "Embeddings could not be generated, cache not saved.",
+            file=sys.stderr,
+        )
 
 
 def get_available_documents() -> List[str]:
@@ -293,5 +575,35 @@ def get_document_headings(filename: str) -> List[Dict[str, Union[int, str]]]:
 
 
 # Expose the chunks for the search module
-def get_all_chunks() -> List[Dict[str, Union[str, np.ndarray]]]:
+def get_chunk_metadata() -> List[Dict[str, str]]:
+    """Returns the chunk metadata list (row i matches embedding row i)."""
     return document_chunks
+
+
+def get_all_embeddings() -> Optional[np.ndarray]:
+    """Returns the (num_chunks, dim) fp32 matrix of unit embeddings, or None."""
+    return document_embeddings
+
+
+def get_embedding_norms() -> Optional[np.ndarray]:
+    """
+    Returns the fp32 norm of each original embedding (0 for chunks without
+    an embedding), or None.
+    """
+    return document_embedding_norms
+
+
+def get_all_chunks() -> List[Dict[str, Union[str, np.ndarray, None]]]:
+    """
+    Returns chunks in the legacy shape, each with its own "embedding" row.
+
+    Prefer get_chunk_metadata() and get_all_embeddings() for bulk access.
+    """
+    if document_embeddings is None:
+        return [{**chunk, "embedding": None} for chunk in document_chunks]
+    return [
+        {**chunk, "embedding": embedding * norm}
+        for chunk, embedding, norm in zip(
+            document_chunks, document_embeddings, document_embedding_norms
+        )
+    ]
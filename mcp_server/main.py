@@ -1,28 +1,49 @@
+import os  # For transport configuration
 import traceback
 import sys  # Import sys for stderr usage
 
-# Import the shared FastMCP instance
-from mcp_server.app import mcp_server as mcp_app_instance
-
-# Import the data loading function and chunk access function
-from mcp_server.data_loader import load_and_chunk_documents, get_all_chunks
-
-# Import the tools module to ensure decorators run and register tools
-import mcp_server.mcp_tools  # noqa: F401
+# Transport to serve on: "stdio" (default, used by Cursor / Claude Desktop)
+# or a network transport such as "sse", which listens on MCP_HOST:MCP_PORT
+TRANSPORT = os.getenv("MCP_TRANSPORT", "stdio").lower()
+HOST = os.getenv("MCP_HOST", "127.0.0.1")
+PORT = int(os.getenv("MCP_PORT", "8000"))
 
 # --- Main Execution (for direct run `python -m mcp_server.main`) ---
 if __name__ == "__main__":
+    # The server modules are imported here rather than at module level:
+    # parser worker processes started with spawn or forkserver (the macOS
+    # default) re-import this module as __mp_main__, and must not import
+    # torch, fastmcp or the embedding model just to parse markdown.
+
+    # Import the shared FastMCP instance
+    from mcp_server.app import mcp_server as mcp_app_instance, prepare_embedding_model
+
+    # Import the data loading function and chunk access function
+    from mcp_server.data_loader import load_and_chunk_documents, get_chunk_metadata
+
+    # Import the tools module to ensure decorators run and register tools
+    import mcp_server.mcp_tools  # noqa: F401
+
     # Load documents synchronously before starting the server
     print("Loading documents...", file=sys.stderr)
     load_and_chunk_documents()
     # Print status after loading
-    num_chunks = len(get_all_chunks())
+    num_chunks = len(get_chunk_metadata())
     print(f"Document loading complete. {num_chunks} chunks loaded.", file=sys.stderr)
+    # Run the one-time ONNX export, if one is needed, before serving
+    prepare_embedding_model()
 
     try:
-        print("Starting MCP server on STDIO...", file=sys.stderr)
         # Call run directly on the imported instance
-        mcp_app_instance.run(transport="stdio")
+        if TRANSPORT == "stdio":
+            print("Starting MCP server on STDIO...", file=sys.stderr)
+            mcp_app_instance.run(transport="stdio")
+        else:
+            print(
+                f"Starting MCP server on {TRANSPORT.upper()} at {HOST}:{PORT}...",
+                file=sys.stderr,
+            )
+            mcp_app_instance.run(transport=TRANSPORT, host=HOST, port=PORT)
     except KeyboardInterrupt:
         print("\nServer stopped by user.", file=sys.stderr)
     except Exception as e:
@@ -0,0 +1,189 @@
+import hashlib  # For content hashes of source files
+import mmap  # For parsing files without reading them into a str first
+import os  # For fstat
+import re
+from pathlib import Path
+from typing import Callable, Dict, List, Union
+
+# Parsing lives outside data_loader so worker processes can import it
+# without loading the embedding model.
+
+# Single regex for the lines that structure a document: markdown headings
+# (##, ###, ####) and Source: URL lines, each including its line break.
+# [^\S\n] is whitespace that does not cross into the next line.
+MARKDOWN_BLOCK_RE = re.compile(
+    r"^(?:(?P<hashes>#{2,4})[^\S\n]+(?P<heading>.*)"
+    r"|Source:[^\S\n]*(?P<source_url>https?://\S+).*)$\n?",
+    re.MULTILINE,
+)
+# Line breaks other than \n that str.splitlines() splits on. Text that
+# contains any of them is normalized to \n first (see
+# parse_markdown_to_chunks), so the patterns only handle \n.
+_LINE_BREAK_RE = re.compile("[\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]")
+# The same line breaks as UTF-8 bytes
+_LINE_BREAK_BYTES_RE = re.compile(rb"[\r\v\f\x1c-\x1e]|\xc2\x85|\xe2\x80[\xa8\xa9]")
+# Same pattern as MARKDOWN_BLOCK_RE for UTF-8 bytes (e.g. a memory-mapped
+# file) without the line breaks above. In bytes mode \s is ASCII-only, so
+# the remaining non-ASCII whitespace that [^\S\n] matches in str mode is
+# spelled out as UTF-8 sequences: U+001F, U+00A0, U+1680, U+2000-200A,
+# U+202F, U+205F, U+3000.
+_LINE_SPACE_BYTES = (
+    rb"(?:[ \t\x1f]|\xc2\xa0|\xe1\x9a\x80"
+    rb"|\xe2\x80[\x80-\x8a\xaf]|\xe2\x81\x9f|\xe3\x80\x80)"
+)
+# Bytes-mode \S minus that whitespace: a URL character, as \S is in str mode
+_URL_CHAR_BYTES = rb"(?:(?!" + _LINE_SPACE_BYTES + rb")\S)"
+MARKDOWN_BLOCK_BYTES_RE = re.compile(
+    rb"^(?:(?P<hashes>#{2,4})" + _LINE_SPACE_BYTES + rb"+(?P<heading>.*)"
+    rb"|Source:" + _LINE_SPACE_BYTES + rb"*(?P<source_url>https?://"
+    + _URL_CHAR_BYTES
+    + rb"+).*)$\n?",
+    re.MULTILINE,
+)
+
+
+def content_hash(data: Union[bytes, mmap.mmap]) -> str:
+    """Returns the content hash used to detect changed source files."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+# Level strings by '#' count (2-4), shared by all chunks
+_HEADING_LEVELS = {2: "2", 3: "3", 4: "4"}
+
+
+def _make_chunk(
+    filename: str, heading: str, content_str: str, source_url: str, level: str
+) -> Dict[str, str]:
+    """Builds the chunk dict for one section."""
+    return {
+        "filename": filename,
+        "heading": heading,
+        "content": content_str,
+        "source_url": source_url,
+        "level": level,
+    }
+
+
+def parse_markdown_to_chunks(filename: str, content: str) -> List[Dict[str, str]]:
+    """
+    Parses markdown content into chunks based on headings (## and deeper).
+
+    Each chunk includes the heading, the content following it, and any
+    detected Source: URL immediately after the heading.
+
+    The text is scanned once with MARKDOWN_BLOCK_RE; chunk content is sliced
+    out of the original string by offset, so no per-line list is built.
+    """
+    # Split lines where splitlines() would (\r\n, \r, \f, \u2028, ...)
+    if _LINE_BREAK_RE.search(content):
+        content = "\n".join(content.splitlines())
+    return _parse_blocks(filename, content, MARKDOWN_BLOCK_RE, str)
+
+
+def _decode_utf8(data: bytes) -> str:
+    return data.decode("utf-8")
+
+
+def _parse_blocks(
+    filename: str,
+    content: Union[str, bytes, mmap.mmap],
+    block_re: re.Pattern,
+    decode: Callable[..., str],
+) -> List[Dict[str, str]]:
+    """
+    Chunking loop shared by the str and bytes parsers. content is scanned
+    with block_re (the matching str or bytes pattern) and only the emitted
+    pieces (content, headings, URLs) are passed through decode.
+    """
+    chunks = []
+    # Default for content before the first heading
+    current_heading = "Introduction"
+    # The current section runs from section_start to the next heading.
+    # Text before a Source: line inside the section is moved to
+    # section_prefix (usually empty), since Source: lines are not content.
+    section_start = 0
+    section_prefix = content[:0]  # Empty str or bytes
+    # Use Union explicitly if Optional was removed from imports
+    current_source_url: Union[str, None] = None
+    # Default heading level, kept as the str stored in chunks
+    heading_level = "1"
+    # Offset right after the current heading line (-1 before the first one)
+    heading_end = -1
+
+    for match in block_re.finditer(content):
+        source_url = match.group("source_url")
+
+        if source_url is None:
+            # Heading: save the previous section as a chunk
+            content_str = decode(
+                section_prefix + content[section_start : match.start()]
+            ).strip()
+            if content_str:  # Only add if there's actual content
+                chunks.append(
+                    _make_chunk(
+                        filename,
+                        current_heading,
+                        content_str,
+                        current_source_url or "",
+                        heading_level,
+                    )
+                )
+
+            # Start a new chunk
+            # '#' count indicates level; taken from the match span so no
+            # group string is created
+            heading_level = _HEADING_LEVELS[match.end("hashes") - match.start()]
+            current_heading = decode(match.group("heading")).strip()
+            section_start = heading_end = match.end()
+            section_prefix = content[:0]
+            current_source_url = None  # Reset source URL for the new section
+            continue
+
+        if match.start() == heading_end or current_heading == "Introduction":
+            # Capture a Source: URL on the line right after a heading, or
+            # anywhere before the first heading
+            current_source_url = decode(source_url)
+        # Cut the Source: line itself out of the content. Right after a
+        # heading the slice is empty and no string is built.
+        section_prefix += content[section_start : match.start()]
+        section_start = match.end()
+
+    # Add the last chunk
+    content_str = decode(section_prefix + content[section_start:]).strip()
+    if content_str:
+        chunks.append(
+            _make_chunk(
+                filename,
+                current_heading,
+                content_str,
+                current_source_url or "",
+                heading_level,
+            )
+        )
+
+    return chunks
+
+
+def parse_markdown_file(path: Path) -> tuple[str, List[Dict[str, str]]]:
+    """
+    Reads one markdown file and returns (content hash, chunks).
+
+    The file is memory-mapped and scanned as bytes, so it is never held in
+    memory as one decoded str; only the emitted chunks are decoded.
+    Top-level so it can be sent to worker processes.
+    """
+    with path.open("rb") as f:
+        # fstat on the open file: the path is not looked up again
+        if os.fstat(f.fileno()).st_size == 0:
+            # mmap cannot map an empty file
+            return content_hash(b""), []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            digest = content_hash(mm)
+            if _LINE_BREAK_BYTES_RE.search(mm):
+                # Line breaks other than \n need normalizing: use the str parser
+                chunks = parse_markdown_to_chunks(path.name, mm[:].decode("utf-8"))
+            else:
+                chunks = _parse_blocks(
+                    path.name, mm, MARKDOWN_BLOCK_BYTES_RE, _decode_utf8
+                )
+    return digest, chunks
@@ -0,0 +1,160 @@
+import sys
+from pathlib import Path
+from typing import List, Union
+
+import numpy as np
+import onnxruntime as ort
+from tokenizers import Tokenizer
+
+from mcp_server.config import ONNX_FILE_NAME, ONNX_INT8_FILE_NAME
+
+
+def _export_onnx(model_name: str, export_dir: Path) -> Path:
+    """
+    Exports the Hugging Face model to ONNX once and returns the graph path.
+
+    The tokenizer files are written next to the graph, so later starts only
+    need onnxruntime and tokenizers.
+    """
+    onnx_path = export_dir / ONNX_FILE_NAME
+    if onnx_path.exists():
+        return onnx_path
+
+    # Imported lazily: exporting pulls in torch/transformers, which are not
+    # needed once the graph exists on disk.
+    from optimum.exporters.onnx import main_export
+
+    print(
+        f"Exporting embedding model '{model_name}' to ONNX: {export_dir}",
+        file=sys.stderr,
+    )
+    export_dir.mkdir(parents=True, exist_ok=True)
+    main_export(model_name, output=export_dir, task="feature-extraction")
+    return onnx_path
+
+
+def _quantize_onnx(onnx_path: Path) -> Path:
+    """
+    Writes a dynamic int8 copy of the graph (weights of MatMul/Gemm only)
+    next to the original once and returns its path.
+    """
+    int8_path = onnx_path.with_name(ONNX_INT8_FILE_NAME)
+    if int8_path.exists():
+        return int8_path
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    print(f"Quantizing ONNX model to int8: {int8_path}", file=sys.stderr)
+    quantize_dynamic(
+        str(onnx_path),
+        str(int8_path),
+        op_types_to_quantize=["MatMul", "Gemm"],
+        weight_type=QuantType.QInt8,
+    )
+    return int8_path
+
+
+class OnnxEncoder:
+    """
+    Drop-in replacement for SentenceTransformer.encode backed by onnxruntime.
+
+    Only the subset of the SentenceTransformer interface used by this server
+    is implemented: encode() on a string or a list of strings.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        export_dir: Path,
+        pooling: str = "cls",
+        max_seq_length: int = 512,
+        quantize: bool = False,
+        num_threads: int = 0,
+    ):
+        onnx_path = _export_onnx(model_name, export_dir)
+        if quantize:
+            onnx_path = _quantize_onnx(onnx_path)
+
+        self.tokenizer = Tokenizer.from_file(str(export_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_seq_length)
+        # Pads to the longest sequence in each batch (not to max_seq_length)
+        self.tokenizer.enable_padding(
+            pad_id=self.tokenizer.token_to_id("<pad>"), pad_token="<pad>"
+        )
+
+        session_options = ort.SessionOptions()
+        session_options.graph_optimization_level = (
+            ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        # 0 lets onnxruntime pick the number of physical cores
+        session_options.intra_op_num_threads = num_threads
+        session_options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            str(onnx_path),
+            sess_options=session_options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.pooling = pooling
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        # First output is the last hidden state: (batch, seq_len, hidden)
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        if self.pooling == "cls":
+            return token_embeddings[:, 0].astype(np.float32)
+        # Mean pooling over non-padding tokens
+        mask = attention_mask[:, :, None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        counts = np.clip(mask.sum(axis=1), 1e-9, None)
+        return (summed / counts).astype(np.float32)
+
+    def encode(
+        self,
+        sentences: Union[str, List[str]],
+        batch_size: int = 32,
+        show_progress_bar: bool = False,
+        convert_to_numpy: bool = True,
+    ) -> np.ndarray:
+        """
+        Encodes text into fp32 embeddings.
+
+        Results are always numpy arrays; convert_to_numpy is accepted for
+        call compatibility with SentenceTransformer.encode.
+
+        Returns a 1-D array for a single string and a 2-D array
+        (len(sentences), hidden) for a list, like SentenceTransformer.
+        """
+        single_input = isinstance(sentences, str)
+        if single_input:
+            sentences = [sentences]
+
+        # Smart batching: encode in order of length so each batch is padded
+        # to similar lengths, then restore the caller's order. Character
+        # length is a cheap proxy for token length (as in SentenceTransformer).
+        order = np.argsort([len(s) for s in sentences], kind="stable")
+        sorted_sentences = [sentences[i] for i in order]
+
+        starts = range(0, len(sorted_sentences), batch_size)
+        if show_progress_bar:
+            from tqdm.auto import tqdm
+
+            starts = tqdm(starts, desc="Batches")
+
+        batches = [
+            self._encode_batch(sorted_sentences[start : start + batch_size])
+            for start in starts
+        ]
+        if not batches:
+            return np.empty((0, 0), dtype=np.float32)
+        sorted_embeddings = np.concatenate(batches, axis=0)
+        embeddings = np.empty_like(sorted_embeddings)
+        embeddings[order] = sorted_embeddings
+        return embeddings[0] if single_input else embeddings
@@ -1,12 +1,13 @@
 from typing import List, Dict, Optional, Union
 import numpy as np
 
-# Import dot_score specifically, as recommended for multi-qa-mpnet-base-dot-v1
-from sentence_transformers.util import dot_score
-
-# Import the shared embedding model instance
-from mcp_server.app import embedding_model
-from mcp_server.data_loader import get_all_chunks  # Changed to absolute import
+# Import the accessor for the shared (lazily loaded) embedding model
+from mcp_server.app import get_embedding_model
+from mcp_server.data_loader import (
+    get_chunk_metadata,
+    get_all_embeddings,
+    get_embedding_norms,
+)
 
 
 def search_chunks(
@@ -14,60 +15,77 @@ def search_chunks(
 ) -> List[Dict[str, Union[str, float]]]:
     """
     Performs semantic search over the loaded document chunks using embeddings.
+
+    Raises RuntimeError if the embedding model could not be loaded, which
+    the MCP tool reports to the client as an error.
     """
-    if not query:
+    if not query or max_results < 1:
         return []
-    all_chunks = get_all_chunks()
-    if not all_chunks:
+    all_chunks = get_chunk_metadata()
+    embeddings = get_all_embeddings()
+    norms = get_embedding_norms()
+    if not all_chunks or embeddings is None:
         # Consider logging this instead of printing
         # import sys
         # print("Warning: No chunks loaded for searching.", file=sys.stderr)
         return []
 
+    # Loaded on the first search; a failed load raises here
+    embedding_model = get_embedding_model()
+
     # Generate embedding for the query
     try:
-        query_embedding = embedding_model.encode(query)
+        query_embedding = np.asarray(embedding_model.encode(query), dtype=np.float32)
     except Exception as e:
         # Consider logging this instead of printing
         # import sys
         # print(f"Error encoding query '{query}': {e}", file=sys.stderr)
         return []  # Cannot search if query encoding fails
 
-    results_with_scores = []
-
-    for idx, chunk in enumerate(all_chunks):
-        # Filter by filename if provided
-        if filename and chunk["filename"] != filename:
-            continue
+    # Filter by filename if provided
+    if filename:
+        candidate_idx = np.array(
+            [i for i, chunk in enumerate(all_chunks) if chunk["filename"] == filename],
+            dtype=np.intp,
+        )
+        if candidate_idx.size == 0:
+            return []
+        candidate_embeddings = embeddings[candidate_idx]
+        candidate_norms = norms[candidate_idx]
+    else:
+        candidate_idx = np.arange(len(all_chunks))
+        candidate_embeddings = embeddings
+        candidate_norms = norms
 
-        # Check if chunk has an embedding
-        chunk_embedding = chunk.get("embedding")
-        if chunk_embedding is None or not isinstance(chunk_embedding, np.ndarray):
-            continue  # Skip chunks without embeddings
+    # Dot product similarity (recommended for multi-qa-mpnet-base-dot-v1)
+    # for all candidates at once. Rows are fp32 unit vectors, so one pass
+    # over the matrix gives the cosine part and the stored norms restore
+    # the dot product. Scores are not bounded to a range like [-1, 1].
+    scores = (candidate_embeddings @ query_embedding) * candidate_norms
+    # Skip chunks without an embedding (norm 0, see get_embedding_norms)
+    has_embedding = candidate_norms > 0
+    if not has_embedding.all():
+        candidate_idx = candidate_idx[has_embedding]
+        scores = scores[has_embedding]
+        if scores.size == 0:
+            return []
 
-        # Calculate dot product similarity (recommended for multi-qa-mpnet-base-dot-v1)
-        try:
-            # Note: dot_score doesn't guarantee a range like [-1, 1], scores can be higher/lower.
-            # util.dot_score returns a tensor, get the single value
-            similarity = dot_score(query_embedding, chunk_embedding)[0][0].item()
-        except Exception as e:
-            # Consider logging this instead of printing
-            # import sys
-            # print(f"Error calculating similarity for chunk {idx}: {e}", file=sys.stderr)
-            similarity = -float("inf")  # Assign a very low score if calculation fails
+    # Select the top results by score (descending)
+    top_k = min(max_results, scores.shape[0])
+    top = np.argpartition(-scores, top_k - 1)[:top_k]
+    top = top[np.argsort(-scores[top])]
 
-        # Store results with scores
-        results_with_scores.append(
+    results = []
+    for pos in top:
+        chunk = all_chunks[candidate_idx[pos]]
+        results.append(
             {
                 "filename": chunk["filename"],
                 "heading": chunk["heading"],
                 "content": chunk["content"],  # Return original content
-                "score": similarity,
+                "score": float(scores[pos]),
                 "source_url": chunk.get("source_url", ""),
             }
         )
 
-    # Sort results by score (descending)
-    results_with_scores.sort(key=lambda x: x["score"], reverse=True)
-
-    return results_with_scores[:max_results]
+    return results
@@ -0,0 +1,199 @@
+import contextlib
+import importlib
+import io
+import os
+import sys
+import tempfile
+import types
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+CONFIG = {"model": "fake", "backend": "onnx", "int8": False}
+
+
+def setUpModule():
+    # data_loader imports the model settings from mcp_server.app, which
+    # imports torch; a stub keeps these tests independent of the model
+    global data_loader
+    app = types.ModuleType("mcp_server.app")
+    app.device = "cpu"
+    app.embedding_config = CONFIG
+    app.get_embedding_model = None  # Patched per test
+    with mock.patch.dict(sys.modules, {"mcp_server.app": app}):
+        sys.modules.pop("mcp_server.data_loader", None)
+        data_loader = importlib.import_module("mcp_server.data_loader")
+
+
+def fake_embedding(text: str) -> np.ndarray:
+    """Deterministic, distinct embedding for each text."""
+    return np.array(
+        [len(text) + 1.0, sum(map(ord, text)) % 97, text.count("e"), 1.0],
+        dtype=np.float32,
+    )
+
+
+class FakeEncoder:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.encoded: list = []
+
+    def encode(self, sentences, **kwargs):
+        if self.fail:
+            raise RuntimeError("encoding failed")
+        self.encoded.extend(sentences)
+        return np.stack([fake_embedding(s) for s in sentences])
+
+
+class LoadAndChunkDocumentsTest(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.storage = Path(tmp_dir.name)
+        for name, value in (
+            ("STORAGE_DIR", self.storage),
+            ("CACHE_META_PATH", self.storage / "chunks.json.gz"),
+            ("CACHE_EMBEDDINGS_PATH", self.storage / "embeddings.npy"),
+            ("CACHE_NORMS_PATH", self.storage / "norms.npy"),
+            ("embedding_config", dict(CONFIG)),
+        ):
+            patcher = mock.patch.object(data_loader, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.write("a.md", "## A1\nalpha one\n## A2\nalpha two\n")
+        self.write("b.md", "## B1\nSource: https://b.io\nbeta one\n")
+        self.write("c.md", "## C1\ngamma\n### C2\ngamma two\n")
+
+    def write(self, name: str, content: str) -> None:
+        (self.storage / name).write_text(content, encoding="utf-8")
+
+    def load(self, encoder: FakeEncoder = None) -> tuple[FakeEncoder, str]:
+        """Runs the loader with encoder; returns it and the stderr output."""
+        encoder = encoder or FakeEncoder()
+        stderr = io.StringIO()
+        with mock.patch.object(
+            data_loader, "get_embedding_model", lambda: encoder
+        ), contextlib.redirect_stderr(stderr):
+            data_loader.load_and_chunk_documents()
+        return encoder, stderr.getvalue()
+
+    def assert_rows(self, missing_files=()):
+        """
+        Checks every chunk's embedding row and norm against the encoder;
+        chunks of missing_files must have zero rows and norm 0.
+        """
+        chunks = data_loader.get_chunk_metadata()
+        embeddings = data_loader.get_all_embeddings()
+        norms = data_loader.get_embedding_norms()
+        self.assertEqual(embeddings.dtype, np.float32)
+        self.assertEqual(embeddings.shape, (len(chunks), 4))
+        self.assertEqual(norms.shape, (len(chunks),))
+        for chunk, row, norm in zip(chunks, embeddings, norms):
+            if chunk["filename"] in missing_files:
+                np.testing.assert_array_equal(row, 0)
+                self.assertEqual(norm, 0)
+                continue
+            expected = fake_embedding(chunk["content"])
+            expected_norm = np.linalg.norm(expected)
+            self.assertAlmostEqual(float(norm), float(expected_norm), places=4)
+            np.testing.assert_allclose(row, expected / expected_norm, rtol=1e-3)
+
+    def chunk_contents(self, filename=None):
+        return sorted(
+            chunk["content"]
+            for chunk in data_loader.get_chunk_metadata()
+            if filename is None or chunk["filename"] == filename
+        )
+
+    def test_cache_hit_encodes_nothing(self):
+        first, _ = self.load()
+        self.assertEqual(len(first.encoded), 5)
+        self.assert_rows()
+
+        second, _ = self.load()
+        self.assertEqual(second.encoded, [])
+        self.assert_rows()
+        self.assertEqual(data_loader.get_available_documents(), ["a.md", "b.md", "c.md"])
+
+    def test_edit_reencodes_only_the_changed_file(self):
+        self.load()
+        self.write("b.md", "## B1\nbeta edited\n## B2\nbeta more\n")
+
+        encoder, _ = self.load()
+        self.assertEqual(sorted(encoder.encoded), ["beta edited", "beta more"])
+        self.assertEqual(self.chunk_contents("b.md"), ["beta edited", "beta more"])
+        self.assert_rows()
+
+        # The merged matrix was cached: the next start is a cache hit
+        encoder, _ = self.load()
+        self.assertEqual(encoder.encoded, [])
+        self.assert_rows()
+
+    def test_delete_drops_the_file(self):
+        self.load()
+        (self.storage / "b.md").unlink()
+
+        encoder, stderr = self.load()
+        self.assertEqual(encoder.encoded, [])
+        self.assertNotIn("Processing", stderr)
+        self.assertEqual(data_loader.get_available_documents(), ["a.md", "c.md"])
+        self.assert_rows()
+
+        encoder, _ = self.load()
+        self.assertEqual(encoder.encoded, [])
+        self.assertEqual(data_loader.get_available_documents(), ["a.md", "c.md"])
+        self.assert_rows()
+
+    def test_touch_only_updates_the_metadata(self):
+        self.load()
+        path = self.storage / "a.md"
+        mtime = path.stat().st_mtime + 100
+        os.utime(path, (mtime, mtime))
+        embeddings_mtime = data_loader.CACHE_EMBEDDINGS_PATH.stat().st_mtime_ns
+
+        encoder, _ = self.load()
+        self.assertEqual(encoder.encoded, [])
+        self.assert_rows()
+        cached_files, _, _ = data_loader._load_cache()
+        self.assertEqual(cached_files["a.md"]["mtime"], mtime)
+        # The embedding matrix itself was not rewritten
+        self.assertEqual(
+            data_loader.CACHE_EMBEDDINGS_PATH.stat().st_mtime_ns, embeddings_mtime
+        )
+
+    def test_failed_encode_keeps_unchanged_files_searchable(self):
+        self.load()
+        self.write("c.md", "## C1\ngamma edited\n")
+
+        _, stderr = self.load(FakeEncoder(fail=True))
+        self.assertIn("Only unchanged documents are searchable", stderr)
+        self.assertEqual(self.chunk_contents("c.md"), ["gamma edited"])
+        self.assert_rows(missing_files={"c.md"})
+
+        # The cache was not saved, so the next start retries the file
+        encoder, _ = self.load()
+        self.assertEqual(encoder.encoded, ["gamma edited"])
+        self.assert_rows()
+
+    def test_failed_encode_without_cache_has_no_embeddings(self):
+        self.load(FakeEncoder(fail=True))
+        self.assertEqual(len(data_loader.get_chunk_metadata()), 5)
+        self.assertIsNone(data_loader.get_all_embeddings())
+        self.assertFalse(data_loader.CACHE_META_PATH.exists())
+
+    def test_config_change_reencodes_everything(self):
+        self.load()
+        with mock.patch.object(
+            data_loader, "embedding_config", {**CONFIG, "int8": True}
+        ):
+            encoder, stderr = self.load()
+        self.assertIn("different embedding model", stderr)
+        self.assertEqual(len(encoder.encoded), 5)
+        self.assert_rows()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+import random
+import re
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Dict, List, Union
+
+from mcp_server.markdown_parser import (
+    content_hash,
+    parse_markdown_file,
+    parse_markdown_to_chunks,
+)
+
+# Reference: the original line-by-line parser the finditer parser replaced
+# (without the unused content_lower / heading_lower fields)
+HEADING_RE = re.compile(r"^(#{2,4})\s+(.*)")
+SOURCE_RE = re.compile(r"Source:\s*(https?://\S+)")
+
+
+def reference_parse(filename: str, content: str) -> List[Dict[str, str]]:
+    chunks = []
+    lines = content.splitlines()
+    current_heading = "Introduction"
+    current_content: List[str] = []
+    current_source_url: Union[str, None] = None
+    heading_level = 1
+
+    def add_chunk():
+        content_str = "\n".join(current_content).strip()
+        if content_str:
+            chunks.append(
+                {
+                    "filename": filename,
+                    "heading": current_heading,
+                    "content": content_str,
+                    "source_url": current_source_url or "",
+                    "level": str(heading_level),
+                }
+            )
+
+    for i, line in enumerate(lines):
+        heading_match = HEADING_RE.match(line)
+        source_match = SOURCE_RE.match(line)
+
+        if heading_match:
+            add_chunk()
+            heading_level = len(heading_match.group(1))
+            current_heading = heading_match.group(2).strip()
+            current_content = []
+            current_source_url = None
+            if i + 1 < len(lines):
+                next_line_source_match = SOURCE_RE.match(lines[i + 1])
+                if next_line_source_match:
+                    current_source_url = next_line_source_match.group(1)
+        elif source_match and current_heading == "Introduction":
+            current_source_url = source_match.group(1)
+        elif not source_match:
+            current_content.append(line)
+
+    add_chunk()
+    return chunks
+
+
+# Lines that exercise headings, Source: lines, whitespace and non-ASCII text
+LINES = [
+    "## A",
+    "### B c",
+    "#### D",
+    "##### E",
+    "#nope",
+    "##",
+    "## ",
+    "##\tTab",
+    "##\xa0nbsp",
+    "##\u3000wide",
+    "##\x1fus",
+    "## Introduction",
+    "#### ",
+    "Source: https://x.io/p",
+    "Source:https://y.io",
+    "Source: ftp://z",
+    "Source: https://z.io trailing",
+    "Source: https://u.io/x\xa0y",
+    "Source: https://\xa0x",
+    "Source: https://\x1f",
+    "Source: https://\u3000x",
+    "text",
+    "  indented",
+    "",
+    "\t",
+    "more text ## not",
+    "é ünï",
+    "végé \xa0",
+]
+# Every line break str.splitlines() recognizes
+LINE_BREAKS = [
+    "\n", "\r\n", "\r", "\v", "\f", "\x1c", "\x1d", "\x1e", "\x85", "\u2028", "\u2029"
+]
+
+
+def random_document(rng: random.Random) -> str:
+    # Mostly \n, with other line breaks mixed into some documents
+    breaks = LINE_BREAKS if rng.random() < 0.5 else ["\n"]
+    parts = []
+    for _ in range(rng.randint(0, 30)):
+        parts.append(rng.choice(LINES))
+        parts.append(rng.choice(breaks))
+    if parts and rng.random() < 0.5:
+        parts.pop()  # No line break at the end
+    return "".join(parts)
+
+
+class ParseMarkdownTest(unittest.TestCase):
+    def test_heading_source_and_content(self):
+        chunks = parse_markdown_to_chunks(
+            "f.md",
+            "intro\n## Setup\nSource: https://x.io/setup\nStep 1\n### Details\nMore\n",
+        )
+        self.assertEqual(
+            [(c["heading"], c["level"], c["source_url"], c["content"]) for c in chunks],
+            [
+                ("Introduction", "1", "", "intro"),
+                ("Setup", "2", "https://x.io/setup", "Step 1"),
+                ("Details", "3", "", "More"),
+            ],
+        )
+
+    def test_unicode_line_separator_ends_heading(self):
+        chunks = parse_markdown_to_chunks("f.md", "## Foo\u2028body")
+        self.assertEqual(chunks, reference_parse("f.md", "## Foo\u2028body"))
+        self.assertEqual(chunks[0]["heading"], "Foo")
+
+    def test_matches_reference_parser(self):
+        rng = random.Random(0)
+        for _ in range(5000):
+            content = random_document(rng)
+            with self.subTest(content=content):
+                self.assertEqual(
+                    parse_markdown_to_chunks("f.md", content),
+                    reference_parse("f.md", content),
+                )
+
+    def test_file_parser_matches_reference_parser(self):
+        rng = random.Random(1)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "f.md"
+            for _ in range(2000):
+                content = random_document(rng)
+                data = content.encode("utf-8")
+                path.write_bytes(data)
+                with self.subTest(content=content):
+                    self.assertEqual(
+                        parse_markdown_file(path),
+                        (content_hash(data), reference_parse("f.md", content)),
+                    )
+
+
+if __name__ == "__main__":
+    unittest.main()